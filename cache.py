@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Sequence
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class LRUCache:
+    """
+    Bounded in-memory cache that evicts the least recently used entry.
+    Entries optionally expire ttl_seconds after they were stored.
+    on_evict(key, value) is called for entries dropped by eviction or expiry.
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        # key -> (value, time.monotonic() expiry or None)
+        self._entries: OrderedDict = OrderedDict()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value (marking it recently used), or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+            return None
+        
+        self._entries.move_to_end(key)
+        return value
+    
+    def put(self, key: Hashable, value: Any):
+        """Insert or refresh an entry, evicting the oldest when full"""
+        expires_at = None
+        if self.ttl_seconds is not None:
+            expires_at = time.monotonic() + self.ttl_seconds
+        
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            old_key, (old_value, _) = self._entries.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(old_key, old_value)
+    
+    def pop(self, key: Hashable):
+        """Drop an entry if present"""
+        self._entries.pop(key, None)
+    
+    def values(self):
+        """Snapshot of cached values (expired entries included until next get)"""
+        return [value for value, _ in self._entries.values()]
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour cache over embeddings.
+    A lookup hits when a stored vector in the same partition has cosine
+    similarity >= threshold. Each partition keeps its newest max_entries
+    vectors. Requires numpy.
+    """
+    
+    def __init__(self, max_entries: int = 2048, threshold: float = 0.92):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        # partition -> (unit vectors matrix, values, number filled, next slot)
+        self._partitions: Dict[Hashable, list] = {}
+    
+    def get(self, partition: Hashable, embedding: Sequence[float]) -> Optional[Any]:
+        """Return the value of the most similar stored vector, or None"""
+        entry = self._partitions.get(partition)
+        if entry is None:
+            return None
+        
+        matrix, values, filled, _ = entry
+        sims = matrix[:filled] @ self._unit(embedding)
+        best = int(sims.argmax())
+        if sims[best] >= self.threshold:
+            return values[best]
+        return None
+    
+    def put(self, partition: Hashable, embedding: Sequence[float], value: Any):
+        """Store a vector, overwriting the oldest one when the partition is full"""
+        vector = self._unit(embedding)
+        entry = self._partitions.get(partition)
+        if entry is None:
+            matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            entry = self._partitions[partition] = [matrix, [None] * self.max_entries, 0, 0]
+        
+        matrix, values, filled, slot = entry
+        matrix[slot] = vector
+        values[slot] = value
+        entry[2] = min(filled + 1, self.max_entries)
+        entry[3] = (slot + 1) % self.max_entries
+    
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> "np.ndarray":
+        """Embedding as a float32 unit vector"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -1,9 +1,54 @@
-from pydantic_settings import BaseSettings
+import os
+from dataclasses import dataclass
 from typing import Optional
 
+from dotenv import load_dotenv
 
-class Settings(BaseSettings):
-    """Application configuration with environment variable support"""
+
+# Read .env once at import; variables already set in the environment win
+load_dotenv(".env")
+
+# Environment variable names are matched case-insensitively
+_ENV = {name.lower(): value for name, value in os.environ.items()}
+
+_TRUE_VALUES = {"1", "true", "t", "yes", "y", "on"}
+_FALSE_VALUES = {"0", "false", "f", "no", "n", "off"}
+
+
+def _env_str(name: str, default: Optional[str]) -> Optional[str]:
+    """Read a string setting"""
+    return _ENV.get(name, default)
+
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer setting"""
+    value = _ENV.get(name)
+    return default if value is None else int(value)
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float setting"""
+    value = _ENV.get(name)
+    return default if value is None else float(value)
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting (true/false, yes/no, on/off, 1/0)"""
+    value = _ENV.get(name)
+    if value is None:
+        return default
+    
+    value = value.strip().lower()
+    if value in _TRUE_VALUES:
+        return True
+    if value in _FALSE_VALUES:
+        return False
+    raise ValueError(f"Invalid boolean for {name.upper()}: {value!r}")
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Application configuration, loaded once from environment variables"""
     
     # LLM Provider Selection
     llm_provider: str = "gemini"  # "ollama" or "gemini"
@@ -27,6 +72,7 @@ class Settings(BaseSettings):
     
     # Features
     enable_audio: bool = False
+    enable_semantic_cache: bool = False
     
     # Server Configuration
     host: str = "0.0.0.0"
@@ -34,16 +80,38 @@ class Settings(BaseSettings):
     
     # Session Configuration
     session_timeout_minutes: int = 30
+    max_sessions: int = 10000
     intervention_cooldown_seconds: int = 30
     
     # Safety Configuration
     max_response_words: int = 18
     escalation_timeout_seconds: int = 120
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = False
 
 
-settings = Settings()
+def load_settings() -> Settings:
+    """Build Settings from the environment, falling back to the defaults above"""
+    defaults = Settings()
+    return Settings(
+        llm_provider=_env_str("llm_provider", defaults.llm_provider),
+        ollama_url=_env_str("ollama_url", defaults.ollama_url),
+        ollama_model=_env_str("ollama_model", defaults.ollama_model),
+        gemini_api_key=_env_str("gemini_api_key", defaults.gemini_api_key),
+        gemini_model=_env_str("gemini_model", defaults.gemini_model),
+        eleven_api_key=_env_str("eleven_api_key", defaults.eleven_api_key),
+        eleven_voice_id=_env_str("eleven_voice_id", defaults.eleven_voice_id),
+        eleven_latency_ms=_env_int("eleven_latency_ms", defaults.eleven_latency_ms),
+        text_weight=_env_float("text_weight", defaults.text_weight),
+        audio_weight=_env_float("audio_weight", defaults.audio_weight),
+        enable_audio=_env_bool("enable_audio", defaults.enable_audio),
+        enable_semantic_cache=_env_bool("enable_semantic_cache", defaults.enable_semantic_cache),
+        host=_env_str("host", defaults.host),
+        port=_env_int("port", defaults.port),
+        session_timeout_minutes=_env_int("session_timeout_minutes", defaults.session_timeout_minutes),
+        max_sessions=_env_int("max_sessions", defaults.max_sessions),
+        intervention_cooldown_seconds=_env_int("intervention_cooldown_seconds", defaults.intervention_cooldown_seconds),
+        max_response_words=_env_int("max_response_words", defaults.max_response_words),
+        escalation_timeout_seconds=_env_int("escalation_timeout_seconds", defaults.escalation_timeout_seconds),
+    )
+
 
+settings = load_settings()
@@ -1,6 +1,90 @@
-import re
-from typing import Tuple, Dict
+from typing import Tuple, Dict, List
 from models import DistressState
+from re_engine import compile_pattern
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+def _expand_literals(pattern: str) -> List[str]:
+    """
+    Expand a keyword pattern into the literal phrases it matches.
+    
+    Only the subset of regex syntax used by the keyword lists is supported:
+    \\b (checked after matching), \\s+ (matched as one space on normalized
+    text), groups with | alternatives, and ? on a group or single character.
+    """
+    variants, _ = _expand_sequence(pattern, 0)
+    return list(dict.fromkeys(variants))
+
+
+def _expand_sequence(pattern: str, pos: int) -> Tuple[List[str], int]:
+    """Expand pattern from pos until the end of the current group alternative"""
+    variants = [""]
+    
+    while pos < len(pattern) and pattern[pos] not in "|)":
+        if pattern.startswith(r"\b", pos):
+            pos += 2
+            continue
+        
+        if pattern.startswith(r"\s+", pos):
+            piece = [" "]
+            pos += 3
+        elif pattern[pos] == "(":
+            piece = []
+            pos += 1
+            while True:
+                alternative, pos = _expand_sequence(pattern, pos)
+                piece.extend(alternative)
+                pos += 1
+                if pattern[pos - 1] == ")":
+                    break
+        else:
+            piece = [pattern[pos]]
+            pos += 1
+        
+        # Optional group or character
+        if pos < len(pattern) and pattern[pos] == "?":
+            piece = piece + [""]
+            pos += 1
+        
+        variants = [v + p for v in variants for p in piece]
+    
+    return variants, pos
+
+
+def _build_combined_regex(categories: Dict[str, List[str]]):
+    """Compile all categories into one pattern with a named group per category"""
+    # match.lastgroup tells us which category hit
+    return compile_pattern(
+        "|".join(
+            f"(?P<{name}>{'|'.join(patterns)})"
+            for name, patterns in categories.items()
+        )
+    )
+
+
+def _build_automaton(categories: Dict[str, List[str]]):
+    """Build one multi-string automaton whose payload is (category index, length)"""
+    automaton = ahocorasick.Automaton()
+    for index, patterns in enumerate(categories.values()):
+        for pattern in patterns:
+            for phrase in _expand_literals(pattern):
+                automaton.add_word(phrase, (index, len(phrase)))
+    automaton.make_automaton()
+    return automaton
+
+
+# Category indices, in TextDistressDetector.CATEGORIES order
+CRISIS, PANIC, OVERWHELMED, RISING, RECOVERY, STOP = range(6)
+
+
+def _is_word_char(char: str) -> bool:
+    """Match an ASCII \\w character, as the regex engines do for these patterns"""
+    return char.isascii() and (char.isalnum() or char == "_")
 
 
 class TextDistressDetector:
@@ -75,13 +159,25 @@ class TextDistressDetector:
         r"\bleave\s+me\s+alone\b",
     ]
     
-    def __init__(self):
-        self.crisis_regex = re.compile("|".join(self.CRISIS_KEYWORDS), re.IGNORECASE)
-        self.panic_regex = re.compile("|".join(self.PANIC_PATTERNS), re.IGNORECASE)
-        self.overwhelmed_regex = re.compile("|".join(self.OVERWHELMED_PATTERNS), re.IGNORECASE)
-        self.rising_regex = re.compile("|".join(self.RISING_PATTERNS), re.IGNORECASE)
-        self.recovery_regex = re.compile("|".join(self.RECOVERY_PATTERNS), re.IGNORECASE)
-        self.stop_regex = re.compile("|".join(self.STOP_WORDS), re.IGNORECASE)
+    # Category name -> pattern list, scanned together in a single pass.
+    # Order must match the category indices defined at module level.
+    CATEGORIES = {
+        "crisis": CRISIS_KEYWORDS,
+        "panic": PANIC_PATTERNS,
+        "overwhelmed": OVERWHELMED_PATTERNS,
+        "rising": RISING_PATTERNS,
+        "recovery": RECOVERY_PATTERNS,
+        "stop": STOP_WORDS,
+    }
+    
+    # Categories reported in match_counts (stop is returned as is_stop)
+    DISTRESS_CATEGORIES = ("crisis", "panic", "overwhelmed", "rising", "recovery")
+    
+    # Compiled once at import; every detector instance shares them
+    category_index = {name: index for index, name in enumerate(CATEGORIES)}
+    combined_regex = _build_combined_regex(CATEGORIES)
+    stop_regex = compile_pattern("|".join(STOP_WORDS))
+    automaton = _build_automaton(CATEGORIES) if AHOCORASICK_AVAILABLE else None
     
     def detect(self, text: str) -> Tuple[float, bool, bool, Dict[str, int]]:
         """
@@ -100,50 +196,69 @@ class TextDistressDetector:
         if not text or not text.strip():
             return 0.0, False, False, {}
         
-        text = text.lower().strip()
+        # Collapse whitespace so \\s+ in the patterns is always a single space
+        text = " ".join(text.lower().split())
         
-        # Check for stop words
-        is_stop = bool(self.stop_regex.search(text))
+        # Count pattern matches for every category in one scan
+        hits = [0] * len(self.CATEGORIES)
+        if self.automaton is not None:
+            last = len(text) - 1
+            for end, (index, length) in self.automaton.iter(text):
+                start = end - length + 1
+                # Enforce the \\b boundaries the patterns are written with
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if end < last and _is_word_char(text[end + 1]):
+                    continue
+                if index == CRISIS:
+                    return self._crisis_result(text, start, hits)
+                hits[index] += 1
+        else:
+            category_index = self.category_index
+            for match in self.combined_regex.finditer(text):
+                index = category_index[match.lastgroup]
+                if index == CRISIS:
+                    return self._crisis_result(text, match.start(), hits)
+                hits[index] += 1
         
-        # Check for crisis keywords (highest priority)
-        is_crisis = bool(self.crisis_regex.search(text))
-        
-        # Count pattern matches
-        match_counts = {
-            "crisis": len(self.crisis_regex.findall(text)),
-            "panic": len(self.panic_regex.findall(text)),
-            "overwhelmed": len(self.overwhelmed_regex.findall(text)),
-            "rising": len(self.rising_regex.findall(text)),
-            "recovery": len(self.recovery_regex.findall(text)),
-        }
+        # Stop words are reported separately from distress counts
+        is_stop = hits[STOP] > 0
         
         # Calculate distress probability
-        distress_prob = self._calculate_probability(match_counts)
+        distress_prob = self._calculate_probability(hits)
         
-        return distress_prob, is_crisis, is_stop, match_counts
+        match_counts = dict(zip(self.DISTRESS_CATEGORIES, hits))
+        return distress_prob, False, is_stop, match_counts
     
-    def _calculate_probability(self, match_counts: Dict[str, int]) -> float:
-        """Calculate distress probability from pattern matches"""
-        
-        # Recovery reduces distress
-        if match_counts["recovery"] > 0:
-            return max(0.0, 0.2 - (match_counts["recovery"] * 0.1))
-        
-        # Crisis is maximum distress (but handled separately)
-        if match_counts["crisis"] > 0:
-            return 1.0
-        
-        # Calculate weighted score
-        score = 0.0
+    def _crisis_result(
+        self,
+        text: str,
+        crisis_start: int,
+        hits: List[int]
+    ) -> Tuple[float, bool, bool, Dict[str, int]]:
+        """
+        Result for text containing a crisis keyword.
         
-        # Panic patterns (high weight)
-        score += match_counts["panic"] * 0.85
+        Crisis keywords have the highest priority, so scanning stops at the
+        first one. Only the stop check still needs the rest of the text:
+        stop words before the crisis keyword are already counted in hits.
+        """
+        is_stop = hits[STOP] > 0 or self.stop_regex.search(text, crisis_start) is not None
+        match_counts = dict.fromkeys(self.DISTRESS_CATEGORIES, 0)
+        match_counts["crisis"] = 1
+        return 1.0, True, is_stop, match_counts
+    
+    def _calculate_probability(self, hits: List[int]) -> float:
+        """Calculate distress probability from per-category match counts"""
         
-        # Overwhelmed patterns (high weight)
-        score += match_counts["overwhelmed"] * 0.80
+        # Recovery reduces distress
+        # (crisis is maximum distress, handled before this in detect)
+        if hits[RECOVERY] > 0:
+            return max(0.0, 0.2 - (hits[RECOVERY] * 0.1))
         
-        # Rising anxiety patterns (medium weight)
-        score += match_counts["rising"] * 0.40
+        # Calculate weighted score:
+        # panic and overwhelmed patterns (high weight), rising anxiety (medium)
+        score = hits[PANIC] * 0.85 + hits[OVERWHELMED] * 0.80 + hits[RISING] * 0.40
         
         # Normalize to 0.0-1.0
         # Cap at 0.95 for non-crisis
@@ -188,11 +303,19 @@ class DistressDetector:
     Main detector that fuses text and optional audio signals.
     """
     
-    def __init__(self, text_weight: float = 0.6, audio_weight: float = 0.4):
+    def __init__(
+        self,
+        text_weight: float = 0.6,
+        audio_weight: float = 0.4,
+        enable_audio: bool = False
+    ):
         self.text_detector = TextDistressDetector()
         self.audio_detector = AudioDistressDetector()
         self.text_weight = text_weight
         self.audio_weight = audio_weight
+        
+        # Resolved once: text-only deployments skip the audio path entirely
+        self.audio_enabled = enable_audio and self.audio_detector.enabled
     
     def detect(
         self,
@@ -213,16 +336,19 @@ class DistressDetector:
         text_prob, is_crisis, is_stop, match_counts = self.text_detector.detect(text)
         
         # Audio detection (optional, secondary signal)
-        audio_prob = 0.0
-        if audio_features:
+        if self.audio_enabled and audio_features:
             audio_prob = self.audio_detector.detect(audio_features)
-        
-        # Fusion: text has priority
-        # If audio is disabled, audio_weight effectively becomes 0
-        final_prob = (self.text_weight * text_prob) + (self.audio_weight * audio_prob)
-        
-        # Ensure within bounds
-        final_prob = max(0.0, min(1.0, final_prob))
+            
+            # Fusion: text has priority
+            final_prob = (self.text_weight * text_prob) + (self.audio_weight * audio_prob)
+            
+            # Ensure within bounds
+            final_prob = max(0.0, min(1.0, final_prob))
+        else:
+            # If audio is disabled, audio_weight effectively becomes 0;
+            # still clamped, since text_weight is configurable
+            audio_prob = 0.0
+            final_prob = max(0.0, min(1.0, self.text_weight * text_prob))
         
         details = {
             "text_prob": text_prob,
@@ -1,9 +1,20 @@
+import asyncio
+import hashlib
+import logging
+import re
 import google.generativeai as genai
 from typing import Optional, Dict
+from cache import LRUCache, SemanticCache, NUMPY_AVAILABLE
 from models import DistressState, InterventionType
 from config import settings
 
 
+logger = logging.getLogger("empathlens.gemini")
+
+# Leading sentence, up to and including its terminator
+_FIRST_SENTENCE = re.compile(r"\s*([^.!?\n]+[.!?])")
+
+
 class GeminiClient:
     """
     Client for interacting with Google Gemini API.
@@ -27,8 +38,8 @@ STRICT RULES:
 8. NEVER give medical advice, diagnoses, or suggest medication
 
 Style: Direct, gentle, one action at a time."""
-    
-    # Fallback responses if Gemini is unavailable
+
+    # Fallback responses (one for every DistressState) if Gemini is unavailable
     FALLBACK_RESPONSES = {
         DistressState.RISING: "Let's slow your breath. In for four, out for four.",
         DistressState.PANIC: "In for four, hold seven, out for eight.",
@@ -38,15 +49,53 @@ Style: Direct, gentle, one action at a time."""
         DistressState.CALM: "How are you feeling right now?",
     }
     
+    # Per-state coaching guidance, part of the static prompt prefix
+    STATE_GUIDANCE = {
+        DistressState.RISING: "Guide them to paced breathing (4-4 or 4-7-8). Be specific with counts.",
+        DistressState.PANIC: "Use 4-7-8 breathing. Say the exact counts: in four, hold seven, out eight.",
+        DistressState.OVERWHELMED: "Use 5-4-3-2-1 grounding. Start with 'Name five things you see.'",
+        DistressState.RECOVERY: "Validate their progress. Keep it brief and present-tense.",
+        DistressState.CRISIS_RISK: "Offer to contact support. Don't attempt coaching.",
+        DistressState.CALM: "Ask a simple check-in question.",
+    }
+    DEFAULT_GUIDANCE = "Respond with empathy and one concrete action."
+    
+    EMBEDDING_MODEL = "models/text-embedding-004"
+    
     def __init__(self):
         self.api_key = settings.gemini_api_key
         self.model_name = settings.gemini_model
         self.enabled = bool(self.api_key)
         
+        # state -> suffix template with the state already baked in
+        self._suffix_templates: Dict[DistressState, str] = {
+            state: (
+                f"User's state: {state.value} (distress level: {{prob:.2f}})\n"
+                'User said: "{message}"\n'
+                "\n"
+                "Respond with ONE sentence, maximum 18 words:"
+            )
+            for state in DistressState
+        }
+        
+        # Exact-match cache of generated replies; see _response_key
+        self._responses = LRUCache(max_entries=1024, ttl_seconds=1800)
+        
+        # cache key -> generation currently in flight for it
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # Paraphrase cache (opt-in): replies keyed by message embedding, per
+        # state and last intervention. Costs an embedding call on every miss.
+        self._semantic: Optional[SemanticCache] = None
+        if self.enabled and settings.enable_semantic_cache and NUMPY_AVAILABLE:
+            self._semantic = SemanticCache(max_entries=2048, threshold=0.92)
+        
         if self.enabled:
             genai.configure(api_key=self.api_key)
             self.model = genai.GenerativeModel(
                 model_name=self.model_name,
+                # Sent on the system-instruction channel, not repeated in each prompt
+                system_instruction=self.SYSTEM_PROMPT,
                 generation_config={
                     "temperature": 0.7,
                     "top_p": 0.9,
@@ -72,68 +121,145 @@ Style: Direct, gentle, one action at a time."""
             distress_prob: Distress probability (0.0-1.0)
             last_intervention: Previous intervention type
             context: Additional context
-            
+        
         Returns:
             Generated coaching line (single sentence, ≤18 words)
         """
         if not self.enabled:
             return self._get_fallback(current_state)
         
-        try:
-            prompt = self._build_prompt(
+        # Crisis replies always go live
+        cache_key = None
+        if current_state != DistressState.CRISIS_RISK:
+            cache_key = self._response_key(
                 user_message,
                 current_state,
                 distress_prob,
                 last_intervention
             )
-            
-            # Call Gemini API
-            response = self.model.generate_content(
-                f"{self.SYSTEM_PROMPT}\n\n{prompt}"
+            cached = self._responses.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        if cache_key is None:
+            return await self._generate(
+                user_message,
+                current_state,
+                distress_prob,
+                last_intervention,
+                None
+            )
+        
+        # Identical requests already in flight share one API call; shielded so
+        # a cancelled caller does not cancel it for the others
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.ensure_future(
+                self._generate(
+                    user_message,
+                    current_state,
+                    distress_prob,
+                    last_intervention,
+                    cache_key
+                )
             )
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        return await asyncio.shield(task)
+    
+    async def _generate(
+        self,
+        user_message: str,
+        current_state: DistressState,
+        distress_prob: float,
+        last_intervention: Optional[InterventionType],
+        cache_key: Optional[str]
+    ) -> str:
+        """Semantic cache lookup, then the Gemini call; caches under cache_key if given"""
+        embedding = None
+        partition = (current_state, last_intervention)
+        if cache_key is not None and self._semantic is not None:
+            embedding = await self._embed(user_message)
+            if embedding is not None:
+                cached = self._semantic.get(partition, embedding)
+                if cached is not None:
+                    self._responses.put(cache_key, cached)
+                    return cached
+        
+        try:
+            # Static prefix first and as its own part, so repeat calls in a
+            # state share a byte-identical prompt prefix
+            prompt_parts = [
+                self._static_prefix(current_state),
+                self._dynamic_suffix(user_message, current_state, distress_prob),
+            ]
+            
+            # Call Gemini API without blocking the event loop
+            response = await self.model.generate_content_async(prompt_parts)
             
             generated = response.text.strip()
             
             # Take only first sentence
-            if "." in generated:
-                generated = generated.split(".")[0] + "."
+            first = _FIRST_SENTENCE.match(generated)
+            if first:
+                generated = first.group(1)
             
+            if cache_key is not None:
+                self._responses.put(cache_key, generated)
+            if embedding is not None:
+                self._semantic.put(partition, embedding, generated)
             return generated
-            
+        
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            logger.warning("gemini_fail state=%s err=%s", current_state.value, e)
             return self._get_fallback(current_state)
     
-    def _build_prompt(
+    async def _embed(self, text: str) -> Optional[list]:
+        """Embedding for the semantic cache, or None if the call fails"""
+        try:
+            result = await genai.embed_content_async(
+                model=self.EMBEDDING_MODEL,
+                content=text,
+                task_type="semantic_similarity"
+            )
+            return result["embedding"]
+        except Exception as e:
+            logger.warning("gemini_embed_fail err=%s", e)
+            return None
+    
+    def _response_key(
         self,
         user_message: str,
         current_state: DistressState,
         distress_prob: float,
         last_intervention: Optional[InterventionType]
     ) -> str:
-        """Build prompt for Gemini with context"""
-        
-        state_guidance = {
-            DistressState.RISING: "Guide them to paced breathing (4-4 or 4-7-8). Be specific with counts.",
-            DistressState.PANIC: "Use 4-7-8 breathing. Say the exact counts: in four, hold seven, out eight.",
-            DistressState.OVERWHELMED: "Use 5-4-3-2-1 grounding. Start with 'Name five things you see.'",
-            DistressState.RECOVERY: "Validate their progress. Keep it brief and present-tense.",
-            DistressState.CRISIS_RISK: "Offer to contact support. Don't attempt coaching.",
-            DistressState.CALM: "Ask a simple check-in question.",
-        }
-        
-        guidance = state_guidance.get(current_state, "Respond with empathy and one concrete action.")
-        
-        prompt = f"""User's state: {current_state.value} (distress level: {distress_prob:.2f})
-User said: "{user_message}"
-
-{guidance}
-
-Respond with ONE sentence, maximum 18 words:"""
-        
-        return prompt
+        """
+        Cache key for a reply. distress_prob is rounded to one decimal so
+        near-identical readings share an entry.
+        """
+        intervention = last_intervention.value if last_intervention else ""
+        return hashlib.sha256(
+            f"{current_state.value}|{round(distress_prob, 1)}|{intervention}|{user_message}".encode()
+        ).hexdigest()
+    
+    def _static_prefix(self, current_state: DistressState) -> str:
+        """State guidance; identical for every call in a state"""
+        return self.STATE_GUIDANCE.get(current_state, self.DEFAULT_GUIDANCE)
+    
+    def _dynamic_suffix(
+        self,
+        user_message: str,
+        current_state: DistressState,
+        distress_prob: float
+    ) -> str:
+        """Per-request part of the prompt, sent after the static prefix"""
+        return self._suffix_templates[current_state].format(
+            prob=distress_prob,
+            message=user_message
+        )
     
     def _get_fallback(self, state: DistressState) -> str:
         """Get fallback response when Gemini is unavailable"""
-        return self.FALLBACK_RESPONSES.get(state, "Take a slow breath.")
+        return self.FALLBACK_RESPONSES[state]
 
@@ -0,0 +1,35 @@
+import httpx
+from typing import Optional
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Shared, keep-alive connection pools for every outbound HTTP call.
+# HTTP/2 is negotiated over TLS when the h2 package is installed.
+_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+# For async callers (Ollama); see async_client()
+_async_client: Optional[httpx.AsyncClient] = None
+
+# For SDKs that run in worker threads (the elevenlabs>=1.0 client); httpx.Client
+# is thread-safe. The SDK client binds it once at import, so it stays open for
+# the life of the process.
+sync_client = httpx.Client(http2=HTTP2_AVAILABLE, limits=_LIMITS, timeout=30.0)
+
+
+def async_client() -> httpx.AsyncClient:
+    """The shared async pool, opened on first use and again after aclose()"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=_LIMITS, timeout=10.0)
+    return _async_client
+
+
+async def aclose():
+    """Close the async pool (app shutdown); a later lifespan opens a new one"""
+    if _async_client is not None:
+        await _async_client.aclose()
@@ -1,5 +1,6 @@
+from collections import defaultdict
 from models import DistressState, InterventionType
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Dict
 
 
 class InterventionManager:
@@ -66,9 +67,36 @@ class InterventionManager:
         ]
     }
     
+    # Prompts that close a multi-step cycle before it starts over
+    GROUNDING_WRAP_UP = "You're here. You're present. Take a slow breath."
+    BREATHING_WRAP_UP = "You're doing well. One more breath."
+    
+    # Fixed results for states without an intervention
+    CALM_RESULT = (InterventionType.CHECK_IN, 0, "How are you feeling right now?")
+    DEFAULT_RESULT = (InterventionType.CHECK_IN, 0, "How are you doing?")
+    
     def __init__(self):
-        self.grounding_step = {}  # chat_id -> current step
-        self.breathing_step = {}  # chat_id -> current step
+        self.grounding_step: Dict[str, int] = defaultdict(int)  # chat_id -> current step
+        self.breathing_step: Dict[str, int] = defaultdict(int)  # chat_id -> current step
+        
+        # state -> every (intervention_type, duration_sec, prompt_text) result
+        # it can return, in step order; single-step interventions have one
+        self._results: Dict[DistressState, Tuple[Tuple[InterventionType, int, str], ...]] = {}
+        for state, (intervention_type, duration, initial_prompt) in self.INTERVENTIONS.items():
+            if intervention_type == InterventionType.GROUNDING_54321:
+                prompts = self.GROUNDING_SEQUENCE + [self.GROUNDING_WRAP_UP]
+                step_duration = duration // len(self.GROUNDING_SEQUENCE)
+            elif intervention_type in self.BREATHING_CUES:
+                cues = self.BREATHING_CUES[intervention_type]
+                prompts = cues + [self.BREATHING_WRAP_UP]
+                step_duration = duration // len(cues)
+            else:
+                prompts = [initial_prompt]
+                step_duration = duration
+            
+            self._results[state] = tuple(
+                (intervention_type, step_duration, prompt) for prompt in prompts
+            )
     
     def get_intervention(
         self,
@@ -88,46 +116,26 @@ class InterventionManager:
             Tuple of (intervention_type, duration_sec, prompt_text)
         """
         if state == DistressState.CALM:
-            return InterventionType.CHECK_IN, 0, "How are you feeling right now?"
-        
-        if state not in self.INTERVENTIONS:
-            return InterventionType.CHECK_IN, 0, "How are you doing?"
+            return self.CALM_RESULT
         
-        intervention_type, duration, initial_prompt = self.INTERVENTIONS[state]
+        results = self._results.get(state)
+        if results is None:
+            return self.DEFAULT_RESULT
         
-        # Handle multi-step interventions
-        if intervention_type == InterventionType.GROUNDING_54321:
-            if chat_id not in self.grounding_step:
-                self.grounding_step[chat_id] = 0
-            
-            step_idx = self.grounding_step[chat_id]
-            if step_idx < len(self.GROUNDING_SEQUENCE):
-                prompt = self.GROUNDING_SEQUENCE[step_idx]
-                self.grounding_step[chat_id] += 1
-            else:
-                prompt = "You're here. You're present. Take a slow breath."
-                self.grounding_step[chat_id] = 0  # Reset
-            
-            return intervention_type, duration // len(self.GROUNDING_SEQUENCE), prompt
+        # Single-step interventions
+        if len(results) == 1:
+            return results[0]
         
-        elif intervention_type in self.BREATHING_CUES:
-            if chat_id not in self.breathing_step:
-                self.breathing_step[chat_id] = 0
-            
-            step_idx = self.breathing_step[chat_id]
-            cues = self.BREATHING_CUES[intervention_type]
-            
-            if step_idx < len(cues):
-                prompt = cues[step_idx]
-                self.breathing_step[chat_id] += 1
-            else:
-                prompt = "You're doing well. One more breath."
-                self.breathing_step[chat_id] = 0  # Reset
-            
-            return intervention_type, duration // len(cues), prompt
+        # Multi-step interventions: return the current step, then advance
+        # (the wrap-up prompt is last and resets the cycle)
+        if results[0][0] == InterventionType.GROUNDING_54321:
+            steps = self.grounding_step
+        else:
+            steps = self.breathing_step
         
-        # Single-step interventions
-        return intervention_type, duration, initial_prompt
+        step_idx = steps[chat_id]
+        steps[chat_id] = step_idx + 1 if step_idx + 1 < len(results) else 0
+        return results[min(step_idx, len(results) - 1)]
     
     def get_checkin_prompt(self) -> Tuple[str, list]:
         """Get check-in prompt and button options"""
@@ -140,6 +148,12 @@ class InterventionManager:
         """Get escalation offer prompt"""
         return "I hear you're struggling. Would you like me to contact your support person?"
     
+    def get_all_prompts(self) -> Tuple[str, ...]:
+        """Every fixed prompt this manager can return, for TTS pre-warming"""
+        prompts = [prompt for results in self._results.values() for _, _, prompt in results]
+        prompts += [self.CALM_RESULT[2], self.DEFAULT_RESULT[2], self.get_escalation_prompt()]
+        return tuple(dict.fromkeys(prompts))
+    
     def reset_steps(self, chat_id: str):
         """Reset intervention steps for a conversation"""
         self.grounding_step.pop(chat_id, None)
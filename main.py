@@ -1,7 +1,14 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
+import logging
+import logging.handlers
+import os
+import queue
+import time
 import uvicorn
+from typing import Optional, Tuple
 
 from models import (
     InferRequest,
@@ -12,6 +19,7 @@ from models import (
     DistressState,
 )
 from config import settings
+import http_pool
 from detector import DistressDetector
 from state_machine import StateMachine
 from interventions import InterventionManager
@@ -22,17 +30,51 @@ from session_manager import SessionManager
 from safety import SafetyFilter, sanitize_user_input
 
 
+# App logs are handed to a queue and written by a background thread, so
+# logging never blocks a request on stream I/O
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+_app_logger = logging.getLogger("empathlens")
+_app_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_app_logger.propagate = False
+
+
+# Fixed check-in replies (spoken, so pre-warmed in the TTS cache)
+CHECKIN_BETTER_REPLY = "Your body is settling. Take two slow breaths."
+CHECKIN_GROUNDING_REPLY = "Let's try grounding. Name five things you can see."
+CHECKIN_BREATHING_REPLY = "In for four, hold seven, out for eight."
+
+# Quick reply button sets, shared by every response
+CHECKIN_BUTTONS: Tuple[str, ...] = ("better", "same", "worse")
+ESCALATION_BUTTONS: Tuple[str, ...] = ("contact_support", "continue_alone")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle manager for startup/shutdown"""
+    _log_listener.start()
+    session_manager.start_cleanup()
+    # Prewarms in the background: requests are served while it runs
+    tts_client.start_cleanup(prewarm=(
+        CHECKIN_BETTER_REPLY,
+        CHECKIN_GROUNDING_REPLY,
+        CHECKIN_BREATHING_REPLY,
+        *intervention_manager.get_all_prompts(),
+        *llm_client.FALLBACK_RESPONSES.values(),
+    ))
     yield
-    tts_client.cleanup_old_files()
+    await session_manager.stop_cleanup()
+    await tts_client.stop_cleanup()
+    await http_pool.aclose()
+    await tts_client.sweep()
+    _log_listener.stop()
 
 
 app = FastAPI(
     title="EmpathLens - Distress Helper",
     description="Local provider for Meta Glasses API distress assistance",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -46,7 +88,8 @@ app.add_middleware(
 
 detector = DistressDetector(
     text_weight=settings.text_weight,
-    audio_weight=settings.audio_weight
+    audio_weight=settings.audio_weight,
+    enable_audio=settings.enable_audio
 )
 state_machine = StateMachine()
 intervention_manager = InterventionManager()
@@ -58,9 +101,60 @@ else:
     llm_client = OllamaClient()
 
 tts_client = TTSClient()
-session_manager = SessionManager()
+
+
+def _forget_chat(chat_id: str):
+    """Drop per-chat state when its session is removed"""
+    state_machine.reset_history(chat_id)
+    intervention_manager.reset_steps(chat_id)
+
+
+session_manager = SessionManager(on_remove=_forget_chat)
 safety_filter = SafetyFilter(max_words=settings.max_response_words)
 
+# Literal replies, serialized once; only per-request fields are filled in
+_STOP_RESPONSE = InferResponse(
+    reply_text="Understood. I'm here if you need me.",
+    expect_followup=False,
+    followup_after_sec=0,
+    buttons=None,
+    audio_url=None,
+    meta=ResponseMeta(state=DistressState.CALM, confidence=1.0)
+).model_dump(mode="json")
+
+_BETTER_RESPONSE = InferResponse(
+    reply_text=CHECKIN_BETTER_REPLY,
+    expect_followup=False,
+    followup_after_sec=0,
+    buttons=None,
+    meta=ResponseMeta(state=DistressState.RECOVERY, confidence=0.0)
+).model_dump(mode="json")
+
+
+def _literal_response(template: dict, audio_url: Optional[str] = None, **meta) -> ORJSONResponse:
+    """
+    Respond with a pre-serialized InferResponse.
+    FastAPI skips response_model validation when a Response is returned directly.
+    """
+    return ORJSONResponse({
+        **template,
+        "audio_url": audio_url,
+        "meta": {**template["meta"], **meta},
+    })
+
+
+def _audio_url(audio_path: Optional[str]) -> Optional[str]:
+    """Route that serves a synthesized audio file"""
+    if audio_path is None:
+        return None
+    return f"/distress/audio/{os.path.basename(audio_path)}"
+
+
+@app.exception_handler(Exception)
+async def internal_error_handler(request: Request, exc: Exception) -> ORJSONResponse:
+    """Generic 500 for unexpected errors, without echoing internals to the client"""
+    return ORJSONResponse(status_code=500, content={"detail": "Internal error"})
+
 
 @app.get("/")
 async def root():
@@ -83,120 +177,116 @@ async def infer_distress(request: InferRequest):
     Processes user message, detects distress, determines state,
     generates coaching response, and optionally synthesizes speech.
     """
-    try:
-        chat_id = request.chat_id
-        user_message = sanitize_user_input(request.message)
-        
-        if not user_message:
-            raise HTTPException(status_code=400, detail="Message cannot be empty")
-        
-        session = session_manager.get_or_create_session(chat_id)
-        
-        distress_prob, is_crisis, is_stop, detection_details = detector.detect(
-            text=user_message,
-            audio_features=None
-        )
-        
-        if is_stop:
-            session_manager.update_session(chat_id, stopped=True)
-            return InferResponse(
-                reply_text="Understood. I'm here if you need me.",
-                expect_followup=False,
-                followup_after_sec=0,
-                buttons=None,
-                audio_url=None,
-                meta=ResponseMeta(
-                    state=DistressState.CALM,
-                    confidence=1.0,
-                    intervention_type=None,
-                    session_duration_seconds=session_manager.get_session_duration(chat_id)
-                )
-            )
-        
-        new_state, state_changed = state_machine.determine_state(
-            session=session,
-            distress_prob=distress_prob,
-            is_crisis=is_crisis
-        )
-        
-        session_manager.update_session(
-            chat_id=chat_id,
-            state=new_state,
-            distress_prob=distress_prob
-        )
-        
-        should_escalate = state_machine.should_escalate(session)
-        
-        if should_escalate and not session.escalation_offered:
-            escalation_text = intervention_manager.get_escalation_prompt()
-            session_manager.update_session(chat_id, escalation_offered=True)
-            
-            audio_url = await tts_client.synthesize(escalation_text)
-            
-            return InferResponse(
-                reply_text=escalation_text,
-                expect_followup=True,
-                followup_after_sec=0,
-                buttons=["contact_support", "continue_alone"],
-                audio_url=audio_url,
-                meta=ResponseMeta(
-                    state=new_state,
-                    confidence=distress_prob,
-                    intervention_type=None,
-                    session_duration_seconds=session_manager.get_session_duration(chat_id)
-                )
-            )
-        
-        intervention_type, duration, base_prompt = intervention_manager.get_intervention(
-            state=new_state,
-            chat_id=chat_id
-        )
-        
-        coaching_text = await llm_client.generate_response(
-            user_message=user_message,
-            current_state=new_state,
-            distress_prob=distress_prob,
-            last_intervention=session.last_intervention,
-            context=detection_details
-        )
-        
-        filtered_text, is_safe = safety_filter.filter(coaching_text)
-        
-        if not is_safe:
-            filtered_text = base_prompt
-        
-        session_manager.update_session(
-            chat_id=chat_id,
-            intervention=intervention_type
+    # One timestamp for the whole request
+    now = time.monotonic()
+    chat_id = request.chat_id
+    user_message = sanitize_user_input(request.message)
+    
+    if not user_message:
+        return ORJSONResponse(status_code=400, content={"detail": "Message cannot be empty"})
+    
+    session = session_manager.get_or_create_session(chat_id, now)
+    
+    distress_prob, is_crisis, is_stop, detection_details = detector.detect(
+        text=user_message,
+        audio_features=None
+    )
+    
+    if is_stop:
+        session_manager.update_session(chat_id, stopped=True, now=now, session=session)
+        return _literal_response(
+            _STOP_RESPONSE,
+            session_duration_seconds=session_manager.get_session_duration(chat_id, now, session)
         )
+    
+    new_state, state_changed = state_machine.determine_state(
+        session=session,
+        distress_prob=distress_prob,
+        is_crisis=is_crisis
+    )
+    
+    session_manager.update_session(
+        chat_id=chat_id,
+        state=new_state,
+        distress_prob=distress_prob,
+        now=now,
+        session=session
+    )
+    
+    should_escalate = state_machine.should_escalate(session, now)
+    
+    if should_escalate and not session.escalation_offered:
+        escalation_text = intervention_manager.get_escalation_prompt()
         
-        audio_url = await tts_client.synthesize(filtered_text)
+        session_manager.update_session(chat_id, escalation_offered=True, now=now, session=session)
         
-        expect_followup = new_state not in [DistressState.CALM, DistressState.RECOVERY]
-        followup_sec = duration if expect_followup else 0
-        
-        should_check_in = (
-            new_state in [DistressState.PANIC, DistressState.OVERWHELMED, DistressState.RISING]
-            and duration > 0
-        )
-        buttons = ["better", "same", "worse"] if should_check_in else None
+        audio_url = _audio_url(await tts_client.synthesize(escalation_text))
         
         return InferResponse(
-            reply_text=filtered_text,
-            expect_followup=expect_followup,
-            followup_after_sec=followup_sec,
-            buttons=buttons,
+            reply_text=escalation_text,
+            expect_followup=True,
+            followup_after_sec=0,
+            buttons=ESCALATION_BUTTONS,
             audio_url=audio_url,
             meta=ResponseMeta(
                 state=new_state,
                 confidence=distress_prob,
-                intervention_type=intervention_type,
-                session_duration_seconds=session_manager.get_session_duration(chat_id)
+                intervention_type=None,
+                session_duration_seconds=session_manager.get_session_duration(chat_id, now, session)
             )
         )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+    
+    intervention_type, duration, base_prompt = intervention_manager.get_intervention(
+        state=new_state,
+        chat_id=chat_id
+    )
+    
+    coaching_text = await llm_client.generate_response(
+        user_message=user_message,
+        current_state=new_state,
+        distress_prob=distress_prob,
+        last_intervention=session.last_intervention,
+        context=detection_details
+    )
+    
+    filtered_text, is_safe = safety_filter.filter(coaching_text)
+    
+    if not is_safe:
+        filtered_text = base_prompt
+    
+    session_manager.update_session(
+        chat_id=chat_id,
+        intervention=intervention_type,
+        now=now,
+        session=session
+    )
+    
+    expect_followup = new_state not in [DistressState.CALM, DistressState.RECOVERY]
+    followup_sec = duration if expect_followup else 0
+    
+    should_check_in = (
+        new_state in [DistressState.PANIC, DistressState.OVERWHELMED, DistressState.RISING]
+        and duration > 0
+    )
+    buttons = CHECKIN_BUTTONS if should_check_in else None
+    
+    # Respond once the first audio chunk is written; the rest follows
+    audio_path, _ = await tts_client.synthesize_stream(filtered_text)
+    audio_url = _audio_url(audio_path)
+    
+    return InferResponse(
+        reply_text=filtered_text,
+        expect_followup=expect_followup,
+        followup_after_sec=followup_sec,
+        buttons=buttons,
+        audio_url=audio_url,
+        meta=ResponseMeta(
+            state=new_state,
+            confidence=distress_prob,
+            intervention_type=intervention_type,
+            session_duration_seconds=session_manager.get_session_duration(chat_id, now, session)
+        )
+    )
 
 
 @app.post("/distress/checkin", response_model=InferResponse)
@@ -206,88 +296,98 @@ async def checkin_followup(request: CheckInRequest):
     
     Processes user's better/same/worse response and adapts next steps.
     """
-    try:
-        chat_id = request.chat_id
-        response_type = request.response
+    # One timestamp for the whole request
+    now = time.monotonic()
+    chat_id = request.chat_id
+    response_type = request.response
+    
+    session = session_manager.get_or_create_session(chat_id, now)
+    
+    if response_type == CheckInResponse.BETTER:
+        session_manager.update_session(
+            chat_id=chat_id,
+            state=DistressState.RECOVERY,
+            now=now,
+            session=session
+        )
+        audio_url = _audio_url(await tts_client.synthesize(CHECKIN_BETTER_REPLY))
         
-        session = session_manager.get_or_create_session(chat_id)
+        return _literal_response(
+            _BETTER_RESPONSE,
+            audio_url,
+            confidence=session.distress_prob,
+            intervention_type=session.last_intervention,
+            session_duration_seconds=session_manager.get_session_duration(chat_id, now, session)
+        )
+    
+    if response_type == CheckInResponse.SAME:
+        current = session.current_state
         
-        if response_type == CheckInResponse.BETTER:
-            new_state = DistressState.RECOVERY
-            reply_text = "Your body is settling. Take two slow breaths."
-            expect_followup = False
-            followup_sec = 0
-            buttons = None
-            
-        elif response_type == CheckInResponse.SAME:
-            current = session.current_state
-            
-            if session.last_intervention in [
-                None,
-                intervention_manager.INTERVENTIONS[DistressState.PANIC][0]
-            ]:
-                new_state = DistressState.OVERWHELMED
-                reply_text = "Let's try grounding. Name five things you can see."
-            else:
-                new_state = DistressState.PANIC
-                reply_text = "In for four, hold seven, out for eight."
-            
-            expect_followup = True
-            followup_sec = 45
-            buttons = ["better", "same", "worse"]
-            
+        if session.last_intervention in [
+            None,
+            intervention_manager.INTERVENTIONS[DistressState.PANIC][0]
+        ]:
+            new_state = DistressState.OVERWHELMED
+            reply_text = CHECKIN_GROUNDING_REPLY
         else:
-            duration = session_manager.get_session_duration(chat_id)
-            
-            if duration >= settings.escalation_timeout_seconds:
-                reply_text = intervention_manager.get_escalation_prompt()
-                session_manager.update_session(chat_id, escalation_offered=True)
-                expect_followup = True
-                followup_sec = 0
-                buttons = ["contact_support", "continue_alone"]
-                new_state = session.current_state
-            else:
-                new_state = session.current_state
-                intervention_type, duration, _ = intervention_manager.get_intervention(
-                    state=new_state,
-                    chat_id=chat_id
-                )
-                
-                reply_text = await llm_client.generate_response(
-                    user_message="feeling worse",
-                    current_state=new_state,
-                    distress_prob=session.distress_prob,
-                    last_intervention=session.last_intervention
-                )
-                
-                reply_text, _ = safety_filter.filter(reply_text)
-                expect_followup = True
-                followup_sec = duration
-                buttons = ["better", "same", "worse"]
+            new_state = DistressState.PANIC
+            reply_text = CHECKIN_BREATHING_REPLY
         
-        session_manager.update_session(
-            chat_id=chat_id,
-            state=new_state
-        )
+        expect_followup = True
+        followup_sec = 45
+        buttons = CHECKIN_BUTTONS
         
-        audio_url = await tts_client.synthesize(reply_text)
+    else:
+        duration = session_manager.get_session_duration(chat_id, now, session)
         
-        return InferResponse(
-            reply_text=reply_text,
-            expect_followup=expect_followup,
-            followup_after_sec=followup_sec,
-            buttons=buttons,
-            audio_url=audio_url,
-            meta=ResponseMeta(
+        if duration >= settings.escalation_timeout_seconds:
+            reply_text = intervention_manager.get_escalation_prompt()
+            session_manager.update_session(chat_id, escalation_offered=True, now=now, session=session)
+            expect_followup = True
+            followup_sec = 0
+            buttons = ESCALATION_BUTTONS
+            new_state = session.current_state
+        else:
+            new_state = session.current_state
+            intervention_type, duration, _ = intervention_manager.get_intervention(
                 state=new_state,
-                confidence=session.distress_prob,
-                intervention_type=session.last_intervention,
-                session_duration_seconds=session_manager.get_session_duration(chat_id)
+                chat_id=chat_id
             )
+            
+            reply_text = await llm_client.generate_response(
+                user_message="feeling worse",
+                current_state=new_state,
+                distress_prob=session.distress_prob,
+                last_intervention=session.last_intervention
+            )
+            
+            reply_text, _ = safety_filter.filter(reply_text)
+            expect_followup = True
+            followup_sec = duration
+            buttons = CHECKIN_BUTTONS
+    
+    session_manager.update_session(
+        chat_id=chat_id,
+        state=new_state,
+        now=now,
+        session=session
+    )
+    
+    audio_url = _audio_url(await tts_client.synthesize(reply_text))
+    
+    return InferResponse(
+        reply_text=reply_text,
+        expect_followup=expect_followup,
+        followup_after_sec=followup_sec,
+        buttons=buttons,
+        audio_url=audio_url,
+        meta=ResponseMeta(
+            state=new_state,
+            confidence=session.distress_prob,
+            intervention_type=session.last_intervention,
+            session_duration_seconds=session_manager.get_session_duration(chat_id, now, session)
         )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal error: {str(e)}")
+    )
 
 
 @app.post("/distress/stop")
@@ -297,6 +397,22 @@ async def stop_session(chat_id: str):
     return {"status": "stopped", "chat_id": chat_id}
 
 
+@app.get("/distress/audio/{filename}")
+async def get_audio(filename: str):
+    """
+    Serve a synthesized audio file (the audio_url in responses).
+    
+    Files still being streamed from TTS are followed until complete.
+    """
+    audio_path = tts_client.audio_file(filename)
+    if audio_path is None:
+        return ORJSONResponse(status_code=404, content={"detail": "Audio not found"})
+    
+    if tts_client.is_writing(audio_path):
+        return StreamingResponse(tts_client.follow_file(audio_path), media_type="audio/mpeg")
+    return FileResponse(audio_path, media_type="audio/mpeg")
+
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
@@ -1,7 +1,9 @@
+from dataclasses import dataclass, field
 from enum import Enum
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, Tuple
 from datetime import datetime
+import time
 
 
 class DistressState(str, Enum):
@@ -37,7 +39,7 @@ class InferRequest(BaseModel):
     message: str = Field(..., description="User's text message")
     chat_id: str = Field(..., description="Unique conversation identifier")
     user_id: Optional[str] = Field(None, description="User identifier")
-    timestamp: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    timestamp: Optional[datetime] = Field(None, description="Client-side message time")
     frame_url: Optional[str] = Field(None, description="Optional image/video frame URL")
 
 
@@ -45,7 +47,7 @@ class CheckInRequest(BaseModel):
     """Request payload for follow-up check-ins"""
     chat_id: str = Field(..., description="Unique conversation identifier")
     response: CheckInResponse = Field(..., description="User's check-in response")
-    timestamp: Optional[datetime] = Field(default_factory=datetime.utcnow)
+    timestamp: Optional[datetime] = Field(None, description="Client-side check-in time")
 
 
 class ResponseMeta(BaseModel):
@@ -61,21 +63,25 @@ class InferResponse(BaseModel):
     reply_text: str = Field(..., description="Text to send/speak to user")
     expect_followup: bool = Field(default=False, description="Whether to expect a follow-up")
     followup_after_sec: int = Field(default=0, description="Seconds until follow-up")
-    buttons: Optional[List[str]] = Field(None, description="Quick reply buttons")
+    buttons: Optional[Tuple[str, ...]] = Field(None, description="Quick reply buttons")
     audio_url: Optional[str] = Field(None, description="URL to generated audio (if available)")
     meta: ResponseMeta = Field(..., description="Metadata about the inference")
 
 
-class SessionState(BaseModel):
-    """Internal session state tracking"""
+@dataclass(slots=True)
+class SessionState:
+    """
+    Internal session state tracking (in-memory only, never serialized).
+    Timestamps are time.monotonic() seconds; only their differences are meaningful.
+    """
     chat_id: str
     current_state: DistressState = DistressState.CALM
     distress_prob: float = 0.0
     last_intervention: Optional[InterventionType] = None
-    last_intervention_time: Optional[datetime] = None
+    last_intervention_mono: Optional[float] = None
     intervention_count: int = 0
-    session_start: datetime = Field(default_factory=datetime.utcnow)
-    last_update: datetime = Field(default_factory=datetime.utcnow)
+    session_start_mono: float = field(default_factory=time.monotonic)
+    last_update_mono: float = field(default_factory=time.monotonic)
     escalation_offered: bool = False
     stopped: bool = False
 
@@ -1,9 +1,14 @@
-import httpx
+import re
+import http_pool
 from typing import Optional, Dict
 from models import DistressState, InterventionType
 from config import settings
 
 
+# Leading sentence, up to and including its terminator
+_FIRST_SENTENCE = re.compile(r"\s*([^.!?\n]+[.!?])")
+
+
 class OllamaClient:
     """
     Client for interacting with local Ollama LLM.
@@ -27,8 +32,8 @@ STRICT RULES:
 8. NEVER give medical advice, diagnoses, or suggest medication
 
 Style: Direct, gentle, one action at a time."""
-    
-    # Fallback responses if Ollama is unavailable
+
+    # Fallback responses (one for every DistressState) if Ollama is unavailable
     FALLBACK_RESPONSES = {
         DistressState.RISING: "Let's slow your breath. In for four, out for four.",
         DistressState.PANIC: "In for four, hold seven, out for eight.",
@@ -38,10 +43,34 @@ Style: Direct, gentle, one action at a time."""
         DistressState.CALM: "How are you feeling right now?",
     }
     
+    # Per-state coaching guidance
+    STATE_GUIDANCE = {
+        DistressState.RISING: "Guide them to paced breathing (4-4 or 4-7-8). Be specific with counts.",
+        DistressState.PANIC: "Use 4-7-8 breathing. Say the exact counts: in four, hold seven, out eight.",
+        DistressState.OVERWHELMED: "Use 5-4-3-2-1 grounding. Start with 'Name five things you see.'",
+        DistressState.RECOVERY: "Validate their progress. Keep it brief and present-tense.",
+        DistressState.CRISIS_RISK: "Offer to contact support. Don't attempt coaching.",
+        DistressState.CALM: "Ask a simple check-in question.",
+    }
+    DEFAULT_GUIDANCE = "Respond with empathy and one concrete action."
+    
     def __init__(self):
         self.base_url = settings.ollama_url
         self.model = settings.ollama_model
         self.timeout = 5.0
+        
+        # state -> prompt template with the state and its guidance baked in
+        self._prompt_templates: Dict[DistressState, str] = {
+            state: (
+                f"User's state: {state.value} (distress level: {{prob:.2f}})\n"
+                'User said: "{message}"\n'
+                "\n"
+                f"{self.STATE_GUIDANCE.get(state, self.DEFAULT_GUIDANCE)}\n"
+                "\n"
+                "Respond with ONE sentence, maximum 18 words:"
+            )
+            for state in DistressState
+        }
     
     async def generate_response(
         self,
@@ -60,7 +89,7 @@ Style: Direct, gentle, one action at a time."""
             distress_prob: Distress probability (0.0-1.0)
             last_intervention: Previous intervention type
             context: Additional context
-            
+        
         Returns:
             Generated coaching line (single sentence, ≤18 words)
         """
@@ -74,34 +103,35 @@ Style: Direct, gentle, one action at a time."""
             )
             
             # Call Ollama
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": prompt,
-                        "system": self.SYSTEM_PROMPT,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.7,
-                            "top_p": 0.9,
-                            "max_tokens": 50,
-                        }
+            response = await http_pool.async_client().post(
+                f"{self.base_url}/api/generate",
+                json={
+                    "model": self.model,
+                    "prompt": prompt,
+                    "system": self.SYSTEM_PROMPT,
+                    "stream": False,
+                    "options": {
+                        "temperature": 0.7,
+                        "top_p": 0.9,
+                        "max_tokens": 50,
                     }
-                )
+                },
+                timeout=self.timeout
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                generated = result.get("response", "").strip()
+                
+                # Take only first sentence
+                first = _FIRST_SENTENCE.match(generated)
+                if first:
+                    generated = first.group(1)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    generated = result.get("response", "").strip()
-                    
-                    # Take only first sentence
-                    if "." in generated:
-                        generated = generated.split(".")[0] + "."
-                    
-                    return generated
-                else:
-                    return self._get_fallback(current_state)
-                    
+                return generated
+            else:
+                return self._get_fallback(current_state)
+        
         except Exception:
             return self._get_fallback(current_state)
     
@@ -113,28 +143,12 @@ Style: Direct, gentle, one action at a time."""
         last_intervention: Optional[InterventionType]
     ) -> str:
         """Build prompt for LLM with context"""
-        
-        state_guidance = {
-            DistressState.RISING: "Guide them to paced breathing (4-4 or 4-7-8). Be specific with counts.",
-            DistressState.PANIC: "Use 4-7-8 breathing. Say the exact counts: in four, hold seven, out eight.",
-            DistressState.OVERWHELMED: "Use 5-4-3-2-1 grounding. Start with 'Name five things you see.'",
-            DistressState.RECOVERY: "Validate their progress. Keep it brief and present-tense.",
-            DistressState.CRISIS_RISK: "Offer to contact support. Don't attempt coaching.",
-            DistressState.CALM: "Ask a simple check-in question.",
-        }
-        
-        guidance = state_guidance.get(current_state, "Respond with empathy and one concrete action.")
-        
-        prompt = f"""User's state: {current_state.value} (distress level: {distress_prob:.2f})
-User said: "{user_message}"
-
-{guidance}
-
-Respond with ONE sentence, maximum 18 words:"""
-        
-        return prompt
+        return self._prompt_templates[current_state].format(
+            prob=distress_prob,
+            message=user_message
+        )
     
     def _get_fallback(self, state: DistressState) -> str:
         """Get fallback response when Ollama is unavailable"""
-        return self.FALLBACK_RESPONSES.get(state, "Take a slow breath.")
+        return self.FALLBACK_RESPONSES[state]
 
@@ -0,0 +1,28 @@
+"""
+Regex engine for the detector and safety keyword patterns.
+
+The patterns are plain regular expressions (no backreferences or
+lookaround), so google-re2 can run them as a linear-time DFA without
+backtracking. Falls back to the standard library re module if re2 is
+not installed.
+"""
+import re
+
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+
+def compile_pattern(pattern: str):
+    """
+    Compile a case-insensitive pattern with the fastest available engine.
+    
+    The keyword lists are English-only, so \\b and \\w use ASCII semantics
+    in both engines (RE2 always does; re needs re.ASCII).
+    """
+    if RE2_AVAILABLE:
+        # re2 takes an Options object rather than re flags
+        return re2.compile(f"(?i){pattern}")
+    return re.compile(pattern, re.IGNORECASE | re.ASCII)
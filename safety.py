@@ -1,5 +1,20 @@
 import re
 from typing import Tuple
+from re_engine import compile_pattern
+
+
+_WS_RE = re.compile(r"\s+")
+
+# Smart quotes -> ASCII quotes, applied in a single translate() pass
+_QUOTE_TABLE = str.maketrans({
+    "\u201c": '"',
+    "\u201d": '"',
+    "\u2018": "'",
+    "\u2019": "'",
+})
+
+# Longest user input we process (prevent abuse)
+_MAX_INPUT_LENGTH = 500
 
 
 class SafetyFilter:
@@ -29,9 +44,21 @@ class SafetyFilter:
         (r"\bdon'?t\s+worry\b", "you're safe right now"),
     ]
     
+    # Medical terms and problematic phrases share one pattern, compiled once
+    # at import; match.lastgroup tells the replacement callback which one hit
+    safety_regex = compile_pattern(
+        "|".join(
+            [f"(?P<medical>{'|'.join(MEDICAL_TERMS)})"]
+            + [f"(?P<phrase_{i}>{pattern})" for i, (pattern, _) in enumerate(PROBLEMATIC_PHRASES)]
+        )
+    )
+    replacements = {
+        f"phrase_{i}": replacement
+        for i, (_, replacement) in enumerate(PROBLEMATIC_PHRASES)
+    }
+    
     def __init__(self, max_words: int = 18):
         self.max_words = max_words
-        self.medical_regex = re.compile("|".join(self.MEDICAL_TERMS), re.IGNORECASE)
     
     def filter(self, text: str) -> Tuple[str, bool]:
         """
@@ -48,16 +75,24 @@ class SafetyFilter:
         
         filtered = text.strip()
         
-        # Check for medical terms (flag as unsafe)
-        if self.medical_regex.search(filtered):
-            return "Let's focus on your breath right now.", False
+        # Replace problematic phrases and look for medical terms in one pass
+        medical_hit = False
         
-        # Replace problematic phrases
-        for pattern, replacement in self.PROBLEMATIC_PHRASES:
-            filtered = re.sub(pattern, replacement, filtered, flags=re.IGNORECASE)
+        def replace(match):
+            nonlocal medical_hit
+            if match.lastgroup == "medical":
+                medical_hit = True
+                return match.group(0)
+            return self.replacements[match.lastgroup]
         
-        # Enforce word limit
-        words = filtered.split()
+        filtered = self.safety_regex.sub(replace, filtered)
+        
+        # Medical terms flag the whole response as unsafe
+        if medical_hit:
+            return "Let's focus on your breath right now.", False
+        
+        # Enforce word limit (bounded split: never more than max_words + 1 parts)
+        words = filtered.split(None, self.max_words)
         if len(words) > self.max_words:
             filtered = " ".join(words[:self.max_words])
             # Ensure it ends with punctuation
@@ -76,11 +111,11 @@ class SafetyFilter:
     
     def is_safe_length(self, text: str) -> bool:
         """Check if text is within safe word limit"""
-        return len(text.split()) <= self.max_words
+        return len(text.split(None, self.max_words)) <= self.max_words
     
     def truncate(self, text: str) -> str:
         """Truncate text to max words"""
-        words = text.split()
+        words = text.split(None, self.max_words)
         if len(words) > self.max_words:
             truncated = " ".join(words[:self.max_words])
             if not truncated.endswith((".", "?", "!")):
@@ -97,17 +132,13 @@ def sanitize_user_input(text: str) -> str:
     if not text:
         return ""
     
+    # Limit length first so the passes below see at most _MAX_INPUT_LENGTH chars
+    text = text[:_MAX_INPUT_LENGTH]
+    
     # Remove excessive whitespace
-    text = re.sub(r"\s+", " ", text).strip()
+    text = _WS_RE.sub(" ", text).strip()
     
     # Normalize quotes
-    text = text.replace(""", '"').replace(""", '"')
-    text = text.replace("'", "'").replace("'", "'")
-    
-    # Limit length (prevent abuse)
-    max_length = 500
-    if len(text) > max_length:
-        text = text[:max_length]
+    text = text.translate(_QUOTE_TABLE)
     
     return text
-
@@ -1,5 +1,7 @@
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
 from models import SessionState, DistressState, InterventionType
 from config import settings
 
@@ -10,21 +12,76 @@ class SessionManager:
     Tracks distress progression, interventions, and timing.
     """
     
-    def __init__(self):
-        self.sessions: Dict[str, SessionState] = {}
+    def __init__(self, on_remove: Optional[Callable[[str], None]] = None):
+        # Called with the chat_id of each session that is evicted, expires
+        # or ends, so per-chat state kept elsewhere is dropped with it
+        self.on_remove = on_remove
+        
+        # Kept in least-recently-updated order, so expired sessions are
+        # always at the front
+        self.sessions: "OrderedDict[str, SessionState]" = OrderedDict()
         self.timeout_minutes = settings.session_timeout_minutes
-    
-    def get_or_create_session(self, chat_id: str) -> SessionState:
-        """Get existing session or create new one"""
-        
-        # Clean up old sessions first
-        self._cleanup_old_sessions()
+        self.max_sessions = settings.max_sessions
         
-        if chat_id not in self.sessions:
-            self.sessions[chat_id] = SessionState(chat_id=chat_id)
+        # Resolved once so the request path never touches settings
+        self._timeout_seconds = self.timeout_minutes * 60
+        self._cooldown = float(settings.intervention_cooldown_seconds)
+        self._cleanup_task: Optional[asyncio.Task] = None
+    
+    def start_cleanup(self):
+        """
+        Start expiring old sessions in the background.
+        Must be called from a running event loop (e.g. app startup).
+        """
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+    
+    async def stop_cleanup(self):
+        """Stop the background cleanup task"""
+        if self._cleanup_task is None:
+            return
+        
+        self._cleanup_task.cancel()
+        try:
+            await self._cleanup_task
+        except asyncio.CancelledError:
+            pass
+        self._cleanup_task = None
+    
+    async def _cleanup_loop(self):
+        """Periodically remove expired sessions, off the request path"""
+        interval = self._timeout_seconds / 4
+        while True:
+            await asyncio.sleep(interval)
+            self._cleanup_old_sessions()
+    
+    def get_or_create_session(self, chat_id: str, now: Optional[float] = None) -> SessionState:
+        """
+        Get existing session or create new one.
         
-        session = self.sessions[chat_id]
-        session.last_update = datetime.utcnow()
+        Args:
+            chat_id: Conversation identifier
+            now: time.monotonic() timestamp for this request (read if omitted)
+        """
+        if now is None:
+            now = time.monotonic()
+        
+        session = self.sessions.get(chat_id)
+        if session is None:
+            session = self.sessions[chat_id] = SessionState(
+                chat_id=chat_id,
+                session_start_mono=now,
+                last_update_mono=now
+            )
+            
+            # Bound memory: drop the least recently updated session
+            if len(self.sessions) > self.max_sessions:
+                evicted, _ = self.sessions.popitem(last=False)
+                self._removed(evicted)
+        else:
+            self.sessions.move_to_end(chat_id)
+        
+        session.last_update_mono = now
         return session
     
     def update_session(
@@ -34,11 +91,22 @@ class SessionManager:
         distress_prob: Optional[float] = None,
         intervention: Optional[InterventionType] = None,
         escalation_offered: bool = False,
-        stopped: bool = False
+        stopped: bool = False,
+        now: Optional[float] = None,
+        session: Optional[SessionState] = None
     ) -> SessionState:
-        """Update session with new information"""
+        """
+        Update session with new information.
         
-        session = self.get_or_create_session(chat_id)
+        Pass the session already fetched with get_or_create_session(chat_id, now)
+        in this request to skip the lookup; it is already in LRU position.
+        """
+        
+        if now is None:
+            now = time.monotonic()
+        
+        if session is None:
+            session = self.get_or_create_session(chat_id, now)
         
         if state is not None:
             session.current_state = state
@@ -48,7 +116,7 @@ class SessionManager:
         
         if intervention is not None:
             session.last_intervention = intervention
-            session.last_intervention_time = datetime.utcnow()
+            session.last_intervention_mono = now
             session.intervention_count += 1
         
         if escalation_offered:
@@ -57,60 +125,75 @@ class SessionManager:
         if stopped:
             session.stopped = True
         
-        session.last_update = datetime.utcnow()
+        session.last_update_mono = now
         return session
     
-    def should_check_in(self, chat_id: str) -> bool:
+    def should_check_in(self, chat_id: str, now: Optional[float] = None) -> bool:
         """
         Determine if it's time for a check-in.
         Check-in after each intervention cycle.
         """
-        session = self.get_or_create_session(chat_id)
+        if now is None:
+            now = time.monotonic()
+        
+        session = self.get_or_create_session(chat_id, now)
         
         # Don't check in if stopped or in crisis
         if session.stopped or session.current_state == DistressState.CRISIS_RISK:
             return False
         
         # Check in after intervention completes
-        if session.last_intervention_time:
-            cooldown = settings.intervention_cooldown_seconds
-            time_since = (datetime.utcnow() - session.last_intervention_time).total_seconds()
-            
-            if time_since >= cooldown:
+        if session.last_intervention_mono is not None:
+            if now - session.last_intervention_mono >= self._cooldown:
                 return True
         
         return False
     
-    def can_intervene(self, chat_id: str) -> bool:
+    def can_intervene(self, chat_id: str, now: Optional[float] = None) -> bool:
         """Check if we're in cooldown period"""
-        session = self.get_or_create_session(chat_id)
+        if now is None:
+            now = time.monotonic()
         
-        if not session.last_intervention_time:
-            return True
+        session = self.get_or_create_session(chat_id, now)
         
-        cooldown = settings.intervention_cooldown_seconds
-        time_since = (datetime.utcnow() - session.last_intervention_time).total_seconds()
+        if session.last_intervention_mono is None:
+            return True
         
-        return time_since >= cooldown
+        return now - session.last_intervention_mono >= self._cooldown
     
-    def get_session_duration(self, chat_id: str) -> int:
-        """Get session duration in seconds"""
-        session = self.get_or_create_session(chat_id)
-        return int((datetime.utcnow() - session.session_start).total_seconds())
+    def get_session_duration(
+        self,
+        chat_id: str,
+        now: Optional[float] = None,
+        session: Optional[SessionState] = None
+    ) -> int:
+        """Get session duration in seconds (session skips the lookup, as in update_session)"""
+        if now is None:
+            now = time.monotonic()
+        
+        if session is None:
+            session = self.get_or_create_session(chat_id, now)
+        return int(now - session.session_start_mono)
     
     def end_session(self, chat_id: str):
         """End and remove a session"""
-        self.sessions.pop(chat_id, None)
+        if self.sessions.pop(chat_id, None) is not None:
+            self._removed(chat_id)
     
     def _cleanup_old_sessions(self):
         """Remove sessions that haven't been updated recently"""
-        cutoff = datetime.utcnow() - timedelta(minutes=self.timeout_minutes)
-        
-        expired = [
-            chat_id for chat_id, session in self.sessions.items()
-            if session.last_update < cutoff
-        ]
-        
-        for chat_id in expired:
-            self.sessions.pop(chat_id, None)
+        cutoff = time.monotonic() - self._timeout_seconds
+        
+        # Oldest first: stop at the first session that is still active
+        while self.sessions:
+            chat_id, session = next(iter(self.sessions.items()))
+            if session.last_update_mono >= cutoff:
+                break
+            del self.sessions[chat_id]
+            self._removed(chat_id)
+    
+    def _removed(self, chat_id: str):
+        """Notify on_remove that a session is gone"""
+        if self.on_remove is not None:
+            self.on_remove(chat_id)
 
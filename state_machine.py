@@ -1,6 +1,38 @@
 from models import DistressState, SessionState
-from typing import Tuple
-from datetime import datetime, timedelta
+from typing import Tuple, Optional, Dict, Deque
+from collections import deque
+from bisect import bisect_right
+import time
+
+
+# Probability band edges for _map_prob_to_state; bisect_right(prob) gives
+# the band index, so each edge belongs to the band above it
+_PROB_BANDS = (0.1, 0.2, 0.5, 0.6)
+
+# State for each band
+_BAND_STATES = (
+    DistressState.CALM,
+    DistressState.CALM,
+    DistressState.RISING,
+    DistressState.OVERWHELMED,
+    DistressState.PANIC,
+)
+
+# State for each band when coming down from active distress
+# (0.1-0.2 is recovery rather than calm)
+_BAND_STATES_FROM_DISTRESS = (
+    DistressState.CALM,
+    DistressState.RECOVERY,
+    DistressState.RISING,
+    DistressState.OVERWHELMED,
+    DistressState.PANIC,
+)
+
+_DISTRESS_STATES = frozenset({
+    DistressState.PANIC,
+    DistressState.OVERWHELMED,
+    DistressState.RISING,
+})
 
 
 class StateMachine:
@@ -22,8 +54,12 @@ class StateMachine:
     # Set to 1 for immediate response (good for demos)
     CONFIRMATION_WINDOW = 1
     
+    # Number of recent proposed states kept per conversation
+    HISTORY_SIZE = 5
+    
     def __init__(self):
-        self.state_history = {}  # chat_id -> list of recent states
+        self.state_history: Dict[str, Deque[DistressState]] = {}  # chat_id -> recent proposed states
+        self.confirm_count: Dict[str, int] = {}  # chat_id -> consecutive identical proposals
     
     def determine_state(
         self,
@@ -53,18 +89,20 @@ class StateMachine:
         
         # Apply hysteresis
         chat_id = session.chat_id
-        if chat_id not in self.state_history:
-            self.state_history[chat_id] = []
+        history = self.state_history.get(chat_id)
+        if history is None:
+            history = self.state_history[chat_id] = deque(maxlen=self.HISTORY_SIZE)
         
-        self.state_history[chat_id].append(proposed_state)
+        # Count how many times in a row this state has been proposed
+        if history and history[-1] == proposed_state:
+            self.confirm_count[chat_id] += 1
+        else:
+            self.confirm_count[chat_id] = 1
         
-        # Keep only recent history
-        if len(self.state_history[chat_id]) > 5:
-            self.state_history[chat_id] = self.state_history[chat_id][-5:]
+        history.append(proposed_state)
         
         # Require confirmation for state changes (smoothing)
-        recent = self.state_history[chat_id][-self.CONFIRMATION_WINDOW:]
-        if len(recent) >= self.CONFIRMATION_WINDOW and all(s == proposed_state for s in recent):
+        if self.confirm_count[chat_id] >= self.CONFIRMATION_WINDOW:
             confirmed_state = proposed_state
         else:
             confirmed_state = current_state
@@ -72,6 +110,11 @@ class StateMachine:
         state_changed = confirmed_state != current_state
         return confirmed_state, state_changed
     
+    def reset_history(self, chat_id: str):
+        """Forget the state history of a conversation"""
+        self.state_history.pop(chat_id, None)
+        self.confirm_count.pop(chat_id, None)
+    
     def _map_prob_to_state(self, prob: float, current_state: DistressState) -> DistressState:
         """Map distress probability to a state, considering current state"""
         
@@ -79,41 +122,33 @@ class StateMachine:
         if current_state == DistressState.RECOVERY and prob < 0.25:
             return DistressState.CALM
         
-        # Check for panic (highest priority)
-        if prob >= 0.6:
-            # Distinguish panic vs overwhelm based on keywords (simplified)
-            return DistressState.PANIC
-        
-        # Check for overwhelmed
-        if 0.5 <= prob < 0.6:
-            return DistressState.OVERWHELMED
-        
-        # Rising anxiety
-        if 0.2 <= prob < 0.5:
-            return DistressState.RISING
-        
-        # Recovery state (after intervention)
-        if current_state in [DistressState.PANIC, DistressState.OVERWHELMED, DistressState.RISING]:
-            if 0.1 <= prob < 0.35:
-                return DistressState.RECOVERY
-        
-        # Calm
-        return DistressState.CALM
+        # Panic >= 0.6, overwhelmed 0.5-0.6, rising 0.2-0.5, otherwise calm;
+        # 0.1-0.2 after an intervention counts as recovery
+        band = bisect_right(_PROB_BANDS, prob)
+        if current_state in _DISTRESS_STATES:
+            return _BAND_STATES_FROM_DISTRESS[band]
+        return _BAND_STATES[band]
     
-    def should_escalate(self, session: SessionState) -> bool:
+    def should_escalate(self, session: SessionState, now: Optional[float] = None) -> bool:
         """
         Determine if we should offer escalation based on session history.
         
         Escalate if:
         - Crisis state detected, OR
         - User has been in high distress for >2 minutes
+        
+        Args:
+            session: Current session state
+            now: time.monotonic() timestamp for this request (read if omitted)
         """
         if session.current_state == DistressState.CRISIS_RISK:
             return True
         
         # Check if in distress for too long
         if session.current_state in [DistressState.PANIC, DistressState.OVERWHELMED]:
-            duration = (datetime.utcnow() - session.session_start).total_seconds()
+            if now is None:
+                now = time.monotonic()
+            duration = now - session.session_start_mono
             if duration > 120:  # 2 minutes
                 return True
         
@@ -2,8 +2,11 @@
 """
 Quick test script to validate EmpathLens setup.
 Run this after starting the service to ensure everything works.
+Scenarios use separate chat_ids, so they run concurrently.
 """
 
+import asyncio
+import contextvars
 import httpx
 import json
 import sys
@@ -11,32 +14,40 @@ import sys
 
 BASE_URL = "http://localhost:8000"
 
+# Output lines of the running scenario; each task gets its own list
+_output: contextvars.ContextVar = contextvars.ContextVar("output")
 
-def test_health():
+
+def log(*args):
+    """Buffer a line for the current scenario so concurrent output stays grouped"""
+    _output.get().append(" ".join(str(arg) for arg in args))
+
+
+async def test_health(client: httpx.AsyncClient):
     """Test health endpoint"""
-    print("Testing /health endpoint...")
+    log("Testing /health endpoint...")
     try:
-        response = httpx.get(f"{BASE_URL}/health")
+        response = await client.get("/health")
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Health check passed: {data['status']}")
-            print(f"   Components: {json.dumps(data['components'], indent=2)}")
+            log(f"✅ Health check passed: {data['status']}")
+            log(f"   Components: {json.dumps(data['components'], indent=2)}")
             return True
         else:
-            print(f"❌ Health check failed: {response.status_code}")
+            log(f"❌ Health check failed: {response.status_code}")
             return False
     except Exception as e:
-        print(f"❌ Could not connect to service: {e}")
-        print("   Make sure the service is running: python main.py")
+        log(f"❌ Could not connect to service: {e}")
+        log("   Make sure the service is running: python main.py")
         return False
 
 
-def test_panic_scenario():
+async def test_panic_scenario(client: httpx.AsyncClient):
     """Test panic attack scenario"""
-    print("\nTesting panic attack scenario...")
+    log("\nTesting panic attack scenario...")
     try:
-        response = httpx.post(
-            f"{BASE_URL}/distress/infer",
+        response = await client.post(
+            "/distress/infer",
             json={
                 "message": "I'm having a panic attack, I can't breathe",
                 "chat_id": "test_panic_123"
@@ -46,27 +57,27 @@ def test_panic_scenario():
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Panic detection successful")
-            print(f"   State: {data['meta']['state']}")
-            print(f"   Confidence: {data['meta']['confidence']:.2f}")
-            print(f"   Reply: {data['reply_text']}")
-            print(f"   Intervention: {data['meta']['intervention_type']}")
+            log(f"✅ Panic detection successful")
+            log(f"   State: {data['meta']['state']}")
+            log(f"   Confidence: {data['meta']['confidence']:.2f}")
+            log(f"   Reply: {data['reply_text']}")
+            log(f"   Intervention: {data['meta']['intervention_type']}")
             return True
         else:
-            print(f"❌ Panic detection failed: {response.status_code}")
-            print(f"   {response.text}")
+            log(f"❌ Panic detection failed: {response.status_code}")
+            log(f"   {response.text}")
             return False
     except Exception as e:
-        print(f"❌ Test failed: {e}")
+        log(f"❌ Test failed: {e}")
         return False
 
 
-def test_overwhelmed_scenario():
+async def test_overwhelmed_scenario(client: httpx.AsyncClient):
     """Test overwhelmed scenario"""
-    print("\nTesting overwhelmed scenario...")
+    log("\nTesting overwhelmed scenario...")
     try:
-        response = httpx.post(
-            f"{BASE_URL}/distress/infer",
+        response = await client.post(
+            "/distress/infer",
             json={
                 "message": "It's too much, I'm shutting down",
                 "chat_id": "test_overwhelmed_123"
@@ -76,24 +87,24 @@ def test_overwhelmed_scenario():
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Overwhelm detection successful")
-            print(f"   State: {data['meta']['state']}")
-            print(f"   Reply: {data['reply_text']}")
+            log(f"✅ Overwhelm detection successful")
+            log(f"   State: {data['meta']['state']}")
+            log(f"   Reply: {data['reply_text']}")
             return True
         else:
-            print(f"❌ Overwhelm detection failed: {response.status_code}")
+            log(f"❌ Overwhelm detection failed: {response.status_code}")
             return False
     except Exception as e:
-        print(f"❌ Test failed: {e}")
+        log(f"❌ Test failed: {e}")
         return False
 
 
-def test_crisis_scenario():
+async def test_crisis_scenario(client: httpx.AsyncClient):
     """Test crisis keyword detection"""
-    print("\nTesting crisis keyword detection...")
+    log("\nTesting crisis keyword detection...")
     try:
-        response = httpx.post(
-            f"{BASE_URL}/distress/infer",
+        response = await client.post(
+            "/distress/infer",
             json={
                 "message": "I don't want to live anymore",
                 "chat_id": "test_crisis_123"
@@ -103,30 +114,30 @@ def test_crisis_scenario():
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Crisis detection successful")
-            print(f"   State: {data['meta']['state']}")
-            print(f"   Reply: {data['reply_text']}")
+            log(f"✅ Crisis detection successful")
+            log(f"   State: {data['meta']['state']}")
+            log(f"   Reply: {data['reply_text']}")
             
             if data['meta']['state'] == 'crisis_risk':
-                print(f"   ✅ Correctly identified as crisis")
+                log(f"   ✅ Correctly identified as crisis")
                 return True
             else:
-                print(f"   ⚠️  State should be 'crisis_risk', got '{data['meta']['state']}'")
+                log(f"   ⚠️  State should be 'crisis_risk', got '{data['meta']['state']}'")
                 return False
         else:
-            print(f"❌ Crisis detection failed: {response.status_code}")
+            log(f"❌ Crisis detection failed: {response.status_code}")
             return False
     except Exception as e:
-        print(f"❌ Test failed: {e}")
+        log(f"❌ Test failed: {e}")
         return False
 
 
-def test_stop_command():
+async def test_stop_command(client: httpx.AsyncClient):
     """Test stop command"""
-    print("\nTesting stop command...")
+    log("\nTesting stop command...")
     try:
-        response = httpx.post(
-            f"{BASE_URL}/distress/infer",
+        response = await client.post(
+            "/distress/infer",
             json={
                 "message": "stop",
                 "chat_id": "test_stop_123"
@@ -136,18 +147,62 @@ def test_stop_command():
         
         if response.status_code == 200:
             data = response.json()
-            print(f"✅ Stop command successful")
-            print(f"   Reply: {data['reply_text']}")
+            log(f"✅ Stop command successful")
+            log(f"   Reply: {data['reply_text']}")
             return True
         else:
-            print(f"❌ Stop command failed: {response.status_code}")
+            log(f"❌ Stop command failed: {response.status_code}")
             return False
     except Exception as e:
-        print(f"❌ Test failed: {e}")
+        log(f"❌ Test failed: {e}")
         return False
 
 
-def main():
+async def test_audio_url(client: httpx.AsyncClient):
+    """Test the audio_url in a reply can be fetched"""
+    log("\nTesting reply audio...")
+    try:
+        response = await client.post(
+            "/distress/infer",
+            json={
+                "message": "I'm feeling a bit anxious",
+                "chat_id": "test_audio_123"
+            },
+            timeout=10.0
+        )
+        audio_url = response.json()["audio_url"]
+        
+        if audio_url is None:
+            log(f"✅ No reply audio (TTS disabled)")
+            return True
+        
+        response = await client.get(audio_url, timeout=30.0)
+        if response.status_code == 200 and response.headers["content-type"] == "audio/mpeg":
+            log(f"✅ Reply audio successful")
+            log(f"   Bytes: {len(response.content)}")
+            return True
+        
+        log(f"❌ Reply audio failed: {response.status_code}")
+        log(f"   {response.text}")
+        return False
+    except Exception as e:
+        log(f"❌ Test failed: {e}")
+        return False
+
+
+async def run_test(test, client: httpx.AsyncClient):
+    """Run one scenario, returning (passed, output lines)"""
+    lines = []
+    _output.set(lines)
+    try:
+        passed = await test(client)
+    except Exception as e:
+        log(f"❌ Test crashed: {e}")
+        passed = False
+    return passed, lines
+
+
+async def run_all():
     print("=" * 60)
     print("EmpathLens Service Test Suite")
     print("=" * 60)
@@ -158,19 +213,22 @@ def main():
         test_overwhelmed_scenario,
         test_crisis_scenario,
         test_stop_command,
+        test_audio_url,
     ]
     
+    # One pooled client shared by every scenario
+    async with httpx.AsyncClient(base_url=BASE_URL) as client:
+        results = await asyncio.gather(*(run_test(test, client) for test in tests))
+    
     passed = 0
     failed = 0
     
-    for test in tests:
-        try:
-            if test():
-                passed += 1
-            else:
-                failed += 1
-        except Exception as e:
-            print(f"❌ Test crashed: {e}")
+    for ok, lines in results:
+        for line in lines:
+            print(line)
+        if ok:
+            passed += 1
+        else:
             failed += 1
     
     print("\n" + "=" * 60)
@@ -185,6 +243,9 @@ def main():
         return 1
 
 
+def main():
+    return asyncio.run(run_all())
+
+
 if __name__ == "__main__":
     sys.exit(main())
-
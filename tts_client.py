@@ -1,20 +1,96 @@
+import asyncio
+import functools
+import hashlib
+import io
 import os
+import re
 import tempfile
-from typing import Optional
+import time
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+import http_pool
+from cache import LRUCache
 from config import settings
 
+# Resolved once: the client API (elevenlabs>=1.0), else the legacy functions
 try:
-    from elevenlabs import generate, set_api_key, Voice, VoiceSettings
+    from elevenlabs.client import ElevenLabs
+    from elevenlabs import VoiceSettings
     ELEVENLABS_AVAILABLE = True
 except ImportError:
+    ElevenLabs = None
     try:
-        from elevenlabs.client import ElevenLabs
-        from elevenlabs import VoiceSettings
+        from elevenlabs import generate, set_api_key, Voice, VoiceSettings
         ELEVENLABS_AVAILABLE = True
     except ImportError:
         ELEVENLABS_AVAILABLE = False
 
 
+# Free space /dev/shm needs before audio goes there: room for a full cache
+# (512 replies at ~100KB each). Docker's default 64MB shm does not qualify.
+_SHM_MIN_FREE_BYTES = 64 * 1024 * 1024
+
+
+def _shm_free_bytes() -> int:
+    """Free space on /dev/shm, or 0 if it is unusable"""
+    if not (os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK)):
+        return 0
+    try:
+        stat = os.statvfs("/dev/shm")
+    except (OSError, AttributeError):
+        return 0
+    return stat.f_bavail * stat.f_frsize
+
+
+def _audio_dir() -> str:
+    """RAM-backed tmpfs when it has room, otherwise the system temp dir"""
+    if _shm_free_bytes() >= _SHM_MIN_FREE_BYTES:
+        return "/dev/shm/empathlens_audio"
+    return os.path.join(tempfile.gettempdir(), "empathlens_audio")
+
+
+def _block_size(directory: str) -> int:
+    """Preferred write size for the filesystem holding directory"""
+    try:
+        return os.statvfs(os.path.dirname(directory)).f_bsize
+    except (OSError, AttributeError):
+        return io.DEFAULT_BUFFER_SIZE
+
+
+AUDIO_DIR = _audio_dir()
+_WRITE_BUFFER_SIZE = _block_size(AUDIO_DIR)
+
+# Names of files this client writes ({cache key}.mp3). Each is written as
+# {name}.{pid}.part and renamed once complete, so a file under its final
+# name is never partial.
+_AUDIO_NAME = re.compile(r"[0-9a-f]{32}\.mp3")
+
+# How often expired audio files are swept while the app runs
+_CLEANUP_INTERVAL_SECONDS = 15 * 60
+
+# Prewarm syntheses in flight at once (spares the API and the thread pool)
+_PREWARM_CONCURRENCY = 3
+
+# Synthesis parameters; part of the audio cache key
+TTS_MODEL = "eleven_monolingual_v1"
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75,
+    "style": 0.0,
+    "use_speaker_boost": True,
+}
+
+
+def _part_path(audio_path: str) -> str:
+    """Where this process writes audio_path until it is complete"""
+    return f"{audio_path}.{os.getpid()}.part"
+
+
+def _resolve(future: asyncio.Future):
+    """Mark future done, once"""
+    if not future.done():
+        future.set_result(None)
+
+
 class TTSClient:
     """
     Client for ElevenLabs text-to-speech.
@@ -26,15 +102,48 @@ class TTSClient:
         self.voice_id = settings.eleven_voice_id
         self.client = None
         
+        # (voice, settings, text) key -> audio file path; files live in
+        # AUDIO_DIR and are deleted when their entry is evicted
+        self._cache = LRUCache(max_entries=512, on_evict=self._discard_audio)
+        self._settings_key = "|".join(
+            [TTS_MODEL] + [str(value) for value in VOICE_SETTINGS.values()]
+        )
+        
+        # audio path -> (synthesis still writing it, its first-chunk future)
+        self._streams: Dict[str, Tuple[asyncio.Task, asyncio.Future]] = {}
+        
+        # Streaming synthesis call with voice and model bound: text -> chunks
+        self._synth_fn: Optional[Callable[..., Iterator[bytes]]] = None
+        self._cleanup_task: Optional[asyncio.Task] = None
+        
         if self.enabled:
             try:
-                from elevenlabs.client import ElevenLabs
-                self.client = ElevenLabs(api_key=settings.eleven_api_key)
-            except ImportError:
-                try:
+                voice_settings = VoiceSettings(**VOICE_SETTINGS)
+                if ElevenLabs is not None:
+                    # Reuse the shared keep-alive pool across syntheses. Only
+                    # the elevenlabs>=1.0 client accepts one; the legacy API
+                    # (the pinned 0.2.x) manages its own connections.
+                    self.client = ElevenLabs(
+                        api_key=settings.eleven_api_key,
+                        httpx_client=http_pool.sync_client
+                    )
+                    self._synth_fn = functools.partial(
+                        self.client.generate,
+                        voice=self.voice_id,
+                        model=TTS_MODEL,
+                        voice_settings=voice_settings,
+                        stream=True
+                    )
+                else:
                     set_api_key(settings.eleven_api_key)
-                except:
-                    self.enabled = False
+                    self._synth_fn = functools.partial(
+                        generate,
+                        voice=Voice(voice_id=self.voice_id, settings=voice_settings),
+                        model=TTS_MODEL,
+                        stream=True
+                    )
+            except Exception:
+                self.enabled = False
     
     async def synthesize(self, text: str) -> Optional[str]:
         """
@@ -42,74 +151,280 @@ class TTSClient:
         
         Args:
             text: Text to synthesize
-            
+        
         Returns:
             Path to generated audio file, or None if TTS unavailable
         """
         if not self.enabled:
             return None
         
-        try:
-            if self.client:
-                audio_generator = self.client.generate(
-                    text=text,
-                    voice=self.voice_id,
-                    model="eleven_monolingual_v1",
-                    voice_settings=VoiceSettings(
-                        stability=0.5,
-                        similarity_boost=0.75,
-                        style=0.0,
-                        use_speaker_boost=True
-                    )
-                )
-                
-                audio_bytes = b"".join(audio_generator)
+        audio_path, stream = self._audio(text)
+        if stream is None:
+            return audio_path
+        
+        # Shielded so a cancelled request does not abort the write for others
+        task, _ = stream
+        return await asyncio.shield(task)
+    
+    async def synthesize_stream(self, text: str) -> Tuple[Optional[str], Optional[asyncio.Task]]:
+        """
+        Start synthesis and return as soon as the first audio chunk is on disk.
+        
+        Args:
+            text: Text to synthesize
+        
+        Returns:
+            (path to the audio file, task that finishes writing it); the task
+            is None for complete audio, and both are None if synthesis failed
+        """
+        if not self.enabled:
+            return None, None
+        
+        audio_path, stream = self._audio(text)
+        if stream is None:
+            return audio_path, None
+        
+        task, first_chunk = stream
+        await asyncio.wait((first_chunk, task), return_when=asyncio.FIRST_COMPLETED)
+        if task.done() and task.result() is None:
+            return None, None
+        return audio_path, task
+    
+    def _audio(self, text: str) -> Tuple[str, Optional[Tuple[asyncio.Task, asyncio.Future]]]:
+        """
+        Audio path for text and, unless that file is complete, the synthesis
+        writing it (started here if none is running yet)
+        """
+        key = self._cache_key(text)
+        audio_path = self._cache.get(key)
+        if audio_path is not None:
+            return audio_path, None
+        
+        # Running syntheses first: their audio is not under its final name yet
+        audio_path = os.path.join(AUDIO_DIR, f"{key}.mp3")
+        stream = self._streams.get(audio_path)
+        if stream is not None:
+            return audio_path, stream
+        
+        if os.path.exists(audio_path):
+            # Complete audio from an earlier run or another worker
+            self._cache.put(key, audio_path)
+            return audio_path, None
+        
+        return audio_path, self._start_synthesis(text, key, audio_path)
+    
+    def _start_synthesis(
+        self,
+        text: str,
+        key: str,
+        audio_path: str
+    ) -> Tuple[asyncio.Task, asyncio.Future]:
+        """
+        Synthesize to audio_path in the background.
+        Returns the task (resolving to the path, or None on failure) and a
+        future set once the first chunk is on disk. The path is cached only
+        after the whole file is written. A synthesis already writing
+        audio_path is returned instead of starting a second one.
+        """
+        stream = self._streams.get(audio_path)
+        if stream is not None:
+            return stream
+        
+        loop = asyncio.get_running_loop()
+        first_chunk = loop.create_future()
+        
+        def on_chunk(chunk: bytes):
+            # Runs in the worker thread, after each chunk is flushed
+            loop.call_soon_threadsafe(_resolve, first_chunk)
+        
+        async def finish() -> Optional[str]:
+            path = await asyncio.to_thread(self._synthesize_sync, text, audio_path, on_chunk)
+            if path is not None:
+                self._cache.put(key, path)
             else:
-                from elevenlabs import generate, Voice
-                audio_bytes = generate(
-                    text=text,
-                    voice=Voice(
-                        voice_id=self.voice_id,
-                        settings=VoiceSettings(
-                            stability=0.5,
-                            similarity_boost=0.75,
-                            style=0.0,
-                            use_speaker_boost=True
-                        )
-                    ),
-                    model="eleven_monolingual_v1"
-                )
-            
-            temp_dir = os.path.join(tempfile.gettempdir(), "empathlens_audio")
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            temp_file = os.path.join(temp_dir, f"response_{hash(text)}.mp3")
-            
-            with open(temp_file, "wb") as f:
-                f.write(audio_bytes)
+                self._cache.pop(key)
+            return path
+        
+        task = asyncio.create_task(finish())
+        stream = self._streams[audio_path] = (task, first_chunk)
+        
+        def forget(_):
+            # Only this synthesis's own entry
+            if self._streams.get(audio_path) is stream:
+                del self._streams[audio_path]
+        
+        task.add_done_callback(forget)
+        return stream
+    
+    def audio_file(self, filename: str) -> Optional[str]:
+        """Path of a synthesized audio file by name, or None if there is none"""
+        if not _AUDIO_NAME.fullmatch(filename):
+            return None
+        
+        audio_path = os.path.join(AUDIO_DIR, filename)
+        if audio_path in self._streams or os.path.isfile(audio_path):
+            return audio_path
+        return None
+    
+    def is_writing(self, audio_path: str) -> bool:
+        """Whether a streaming synthesis is still writing audio_path"""
+        return audio_path in self._streams
+    
+    async def follow_file(self, audio_path: str) -> AsyncIterator[bytes]:
+        """Yield a file's bytes, following it until its synthesis finishes"""
+        task, first_chunk = self._streams.get(audio_path, (None, None))
+        f = None
+        if task is not None:
+            # Tail the partial file; once open, the rename does not affect it
+            await asyncio.wait((first_chunk, task), return_when=asyncio.FIRST_COMPLETED)
+            try:
+                f = open(_part_path(audio_path), "rb")
+            except FileNotFoundError:
+                pass
+        
+        if f is None:
+            try:
+                f = open(audio_path, "rb")
+            except FileNotFoundError:
+                # Removed after a failed write
+                return
+        
+        with f:
+            while True:
+                # Checked before reading: once the writer is done, a read
+                # that comes back empty really is the end of the file
+                finished = task is None or task.done()
+                chunk = await asyncio.to_thread(f.read, _WRITE_BUFFER_SIZE * 16)
+                if chunk:
+                    yield chunk
+                elif finished:
+                    return
+                else:
+                    # Wait for the writer to add more, or finish
+                    await asyncio.wait((task,), timeout=0.05)
+    
+    async def prewarm(self, texts: Iterable[str]):
+        """Synthesize fixed phrases ahead of time so they are served from cache"""
+        if not self.enabled:
+            return
+        
+        limit = asyncio.Semaphore(_PREWARM_CONCURRENCY)
+        
+        async def warm(text: str):
+            async with limit:
+                await self.synthesize(text)
+        
+        await asyncio.gather(*(warm(text) for text in dict.fromkeys(texts)))
+    
+    def _cache_key(self, text: str) -> str:
+        """Stable cache key for text spoken with the configured voice and settings"""
+        return hashlib.blake2b(
+            f"{self.voice_id}|{self._settings_key}|{text}".encode(),
+            digest_size=16
+        ).hexdigest()
+    
+    def _synthesize_sync(
+        self,
+        text: str,
+        audio_path: str,
+        on_chunk: Optional[Callable[[bytes], None]] = None
+    ) -> Optional[str]:
+        """
+        Blocking synthesis, written chunk by chunk to a partial file that is
+        renamed to audio_path once complete.
+        Calls on_chunk with each chunk once it is on disk.
+        Returns the path, or None on failure.
+        """
+        part_path = _part_path(audio_path)
+        try:
+            os.makedirs(AUDIO_DIR, exist_ok=True)
             
-            return temp_file
+            # Exclusive create; per process, so other workers writing the
+            # same audio use their own partial file
+            fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except OSError:
+            return None
+        
+        try:
+            with os.fdopen(fd, "wb", buffering=_WRITE_BUFFER_SIZE) as f:
+                for chunk in self._synth_fn(text=text):
+                    f.write(chunk)
+                    if on_chunk is not None:
+                        f.flush()
+                        on_chunk(chunk)
             
+            os.replace(part_path, audio_path)
+            return audio_path
+        
         except Exception:
+            # Never leave a truncated file behind
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
             return None
     
-    def cleanup_old_files(self, max_age_hours: int = 1):
-        """Clean up old audio files"""
+    def start_cleanup(self, prewarm: Iterable[str] = ()):
+        """
+        Start sweeping expired audio files in the background, after
+        prewarming the given phrases (also in the background).
+        Must be called from a running event loop (e.g. app startup).
+        """
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop(tuple(prewarm)))
+    
+    async def stop_cleanup(self):
+        """Stop the background cleanup task"""
+        if self._cleanup_task is None:
+            return
+        
+        self._cleanup_task.cancel()
+        try:
+            await self._cleanup_task
+        except asyncio.CancelledError:
+            pass
+        self._cleanup_task = None
+    
+    async def _cleanup_loop(self, prewarm: Tuple[str, ...]):
+        """Prewarm, then periodically remove expired audio files, off the request path"""
+        # First, so phrase files already on disk are cached and survive the sweep
+        await self.prewarm(prewarm)
+        while True:
+            await self.sweep()
+            await asyncio.sleep(_CLEANUP_INTERVAL_SECONDS)
+    
+    async def sweep(self):
+        """Remove expired audio files in a worker thread, keeping cached and in-progress ones"""
+        # Snapshot on the event loop; the sweep itself runs in a thread
+        keep = {*self._cache.values(), *self._streams}
+        await asyncio.to_thread(self.cleanup_old_files, keep=keep)
+    
+    @staticmethod
+    def _discard_audio(key: str, audio_path: str):
+        """Delete the file of an evicted cache entry"""
+        try:
+            os.remove(audio_path)
+        except OSError:
+            pass
+    
+    def cleanup_old_files(self, max_age_hours: int = 1, keep: Optional[Set[str]] = None):
+        """
+        Clean up expired audio files, keeping those in keep (by default,
+        those still in the cache).
+        Blocking; from async code use sweep(), which snapshots keep on the
+        event loop and runs this in a worker thread.
+        """
         try:
-            temp_dir = os.path.join(tempfile.gettempdir(), "empathlens_audio")
-            if not os.path.exists(temp_dir):
-                return
-            
-            import time
             now = time.time()
             max_age_seconds = max_age_hours * 3600
+            cached = set(self._cache.values()) if keep is None else keep
             
-            for filename in os.listdir(temp_dir):
-                filepath = os.path.join(temp_dir, filename)
-                if os.path.isfile(filepath):
-                    age = now - os.path.getmtime(filepath)
-                    if age > max_age_seconds:
-                        os.remove(filepath)
+            # scandir entries carry their own (cached) stat, one syscall each
+            with os.scandir(AUDIO_DIR) as entries:
+                for entry in entries:
+                    if entry.path in cached or not entry.is_file(follow_symlinks=False):
+                        continue
+                    if now - entry.stat(follow_symlinks=False).st_mtime > max_age_seconds:
+                        os.unlink(entry.path)
         except Exception:
             pass
-